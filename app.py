@@ -1,31 +1,41 @@
 
 import os
+import functools
 from dotenv import load_dotenv
-from groq import Groq
+from groq import AsyncGroq
 from rich.console import Console
 from rich.markdown import Markdown
 from rich.panel import Panel
 from rich.text import Text
 import asyncio
 
+try:
+    import uvloop  # Optional: faster event loop for streamed responses; not available on Windows
+except ImportError:
+    uvloop = None
+
 # Always load .env from the project root
 from pathlib import Path
 dotenv_path = Path(__file__).parent / '.env'
-print(f"Loading .env from: {dotenv_path}")
-load_dotenv(dotenv_path=dotenv_path)
 
 class GroqInference:
     """A class to handle Groq API inference with streaming and colored output."""
 
     def __init__(self, model="llama3-70b-8192", temperature=0.7, max_tokens=500):
-        """Initialize the Groq client with environment variables and model settings."""
-        self.api_key = os.getenv("GROQ_API_KEY")
-        self.client = Groq(api_key=self.api_key)
+        """Store model settings; the Groq client is created on first inference."""
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.console = Console()  # Initialize rich console for pretty printing
 
+    @functools.cached_property
+    def client(self):
+        """Load .env and build the Groq client on first use."""
+        print(f"Loading .env from: {dotenv_path}")
+        load_dotenv(dotenv_path=dotenv_path)
+        self.api_key = os.getenv("GROQ_API_KEY")
+        return AsyncGroq(api_key=self.api_key)
+
     def _format_message(self, content, role="assistant"):
         """Format a message with rich styling based on role."""
         if role == "user":
@@ -49,7 +59,7 @@ class GroqInference:
             self.console.print(self._format_message(prompt, role="user"))
 
             # Initialize streaming chat completion
-            stream = self.client.chat.completions.create(
+            stream = await self.client.chat.completions.create(
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt},
@@ -61,12 +71,13 @@ class GroqInference:
             )
 
             # Stream and print responses with rich formatting
-            response_content = ""
-            for chunk in stream:
+            parts = []
+            async for chunk in stream:
                 content = chunk.choices[0].delta.content
                 if content:
-                    response_content += content
+                    parts.append(content)
                     #self.console.print(Text(content, style="white"), end="", soft_wrap=True)
+            response_content = "".join(parts)
 
             # Print complete response in a formatted panel
             self.console.print("\n")  # New line after streaming
@@ -83,7 +94,10 @@ class GroqInference:
 
     def run(self, prompt, system_prompt="You are a helpful AI assistant."):
         """Synchronous wrapper to run the async stream_inference method."""
-        asyncio.run(self.stream_inference(prompt, system_prompt))
+        if uvloop is not None:
+            uvloop.run(self.stream_inference(prompt, system_prompt))
+        else:
+            asyncio.run(self.stream_inference(prompt, system_prompt))
 
 # Example usage
 if __name__ == "__main__":
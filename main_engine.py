@@ -1,56 +1,457 @@
 import os
-import ast
+import asyncio
 import json
+import functools
+import hashlib
+import importlib.util
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-from pprint import PrettyPrinter
-from groq import Groq, GroqError
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple, Union
 import logging
 import re
-import litellm
-from litellm import completion
 from dotenv import load_dotenv
 
+try:
+    import orjson  # Optional: faster serialization of plans sent back to the LLM
+except ImportError:
+    orjson = None
+
+# groq, litellm and rich are imported where they are first used, so importing this module
+# (e.g. for `run_main_engine.py --help`) does not pay their start-up cost.
+if TYPE_CHECKING:
+    import httpx
+    from groq import AsyncGroq, Groq
+    from rich.console import Console
+
+def _concurrency_from_env(default: int = 8) -> int:
+    """Read CONCURRENCY from the environment, falling back to default if it is not an integer and clamping to >= 1."""
+    raw = os.getenv('CONCURRENCY')
+    if raw is None:
+        return default
+    try:
+        value = int(raw)
+    except ValueError:
+        logging.getLogger(__name__).warning(f"Ignoring non-integer CONCURRENCY={raw!r}; using {default}.")
+        return default
+    if value < 1:
+        # A zero-sized semaphore would block every request forever
+        logging.getLogger(__name__).warning(f"CONCURRENCY={value} is below 1; using 1.")
+        return 1
+    return value
+
+
+# Upper bound on in-flight LLM requests, to stay within provider rate limits.
+MAX_CONCURRENT_REQUESTS = _concurrency_from_env()
+
+# Two-level response cache: an in-process LRU in front of a shared SQLite file.
+LLM_CACHE_PATH = Path.home() / '.cache' / 'coding_agent' / 'llm_cache.sqlite3'
+LLM_CACHE_MAXSIZE = 512
+LLM_CACHE_TTL = 7 * 24 * 3600  # seconds before a stored response is considered stale
+
+# LiteLLM model used for each provider name accepted by CodingAgent.
+LITELLM_MODELS = {
+    "gemini": "gemini/gemini-2.5-pro",
+    "groq": "groq/llama3-70b-8192",
+    "openai": "openai/gpt-4o-mini",
+    "ollama": "ollama/granite3.1-moe:3b",
+}
+
+# Connection pool shared by the async Groq and LiteLLM clients, sized above MAX_CONCURRENT_REQUESTS.
+HTTP_MAX_CONNECTIONS = 64
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 32
+HTTP_TIMEOUT = 60.0  # seconds
+
+# Sampling temperature for every agent call; low enough that cached responses stay representative.
+LLM_TEMPERATURE = 0.1
+
+# Stub files generated per batched request. Larger batches risk the JSON reply being cut off
+# at the model's output-token limit; anything missing from a reply is regenerated per file.
+CONTENT_BATCH_SIZE = 8
+
+# Only files with these extensions (or none, e.g. Dockerfile) are checked for instructional stubs.
+TEXT_EXTS = frozenset({
+    "", ".py", ".js", ".ts", ".md", ".rst", ".txt", ".json", ".yaml", ".yml", ".toml",
+    ".ini", ".cfg", ".html", ".css", ".sh",
+})
+STUB_PEEK_BYTES = 4096
+
+# Per-project record of {relative path: sha256 of the refined code}, so files that have not
+# changed since their last refinement are not sent back through the LLM.
+REFINED_MANIFEST = '.llm_refined.json'
+
+# System prompts are kept static and module-level so every call shares an identical prefix,
+# which lets providers with prompt caching reuse it; only the user message varies per call.
+SYSTEM_PLANNER = (
+    "You are a master software architect. Based on the user's request, create a comprehensive project blueprint. "
+    "The blueprint must be a single, clean JSON object, without any surrounding text or markdown. "
+    "It must contain two keys: 'readme_content' and 'project_structure'. "
+    "The 'readme_content' value must be a single string with properly escaped newlines () to be valid JSON. "
+    "The 'project_structure' value should be a JSON object representing the file and directory structure, with instructional comments in each file."
+)
+SYSTEM_VERIFIER = (
+    "You are a meticulous project manager. Your task is to review the provided project blueprint. "
+    "Assess if the plan is logical, complete, and accurately reflects the user's initial request. "
+    "Respond with only 'APPROVED' if the plan is good, or 'REJECTED:' followed by your specific feedback for improvement."
+)
+SYSTEM_CONTENT_GEN = (
+    "You are a sophisticated AI file processor. Based on the instructional comments provided, generate the full, complete content for the file. "
+    "Return only the raw code or text for the file, without any surrounding text, explanations, or markdown."
+)
+SYSTEM_CONTENT_GEN_BATCH = (
+    "You are a sophisticated AI file processor. You will receive a JSON object mapping file paths to the instructional comments for each file. "
+    "Generate the full, complete content for every file. Respond with a single JSON object mapping each of the same paths to the raw file content "
+    "as a string, without any surrounding text, explanations, or markdown."
+)
+SYSTEM_REFINER = (
+    "You are an expert Python programmer and code reviewer. You will be given the content of a Python file. "
+    "Format it according to PEP 8, refactor it for clarity and efficiency, fix any bugs or unhandled edge cases, and add or improve docstrings and comments. "
+    "Return only the cleaned, refactored and debugged code, without any surrounding text, explanations, or markdown."
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_env() -> None:
+    """Load API keys from .env once, on first API use."""
+    load_dotenv()
+
+
+def dump_json(obj) -> str:
+    """Serialize obj as 2-space indented JSON for embedding in prompts. Parsing LLM output stays on the stdlib."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(obj, indent=2)
+
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_BLOCK_RE = re.compile(r'```json\s*([\s\S]+?)\s*```')
+
+
+def _iter_files(root: Union[str, Path]) -> Iterator["os.DirEntry[str]"]:
+    """Yield a DirEntry for every regular file under root, walking with os.scandir and an explicit stack."""
+    stack = [os.fspath(root)]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue  # Unreadable directories are skipped, as os.walk does
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    yield entry
+
+
+def _read_instructions(entry: "os.DirEntry[str]") -> Optional[str]:
+    """Return the file's text if it is an instructional stub (starts with '#'), else None.
+
+    Only the first STUB_PEEK_BYTES are read to decide; the rest is read only for stubs.
+    """
+    if entry.stat().st_size == 0:
+        return None
+    with open(entry.path, 'rb') as f:
+        head = f.read(STUB_PEEK_BYTES)
+        if not head.lstrip().startswith(b'#'):
+            return None
+        data = head + f.read()
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def _build_messages(system_prompt: str, prompt: str, history: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+    """Chat messages for a request: the system prompt, any earlier turns, then the new user prompt."""
+    return [{"role": "system", "content": system_prompt}, *(history or []), {"role": "user", "content": prompt}]
+
+
+def _decode_first_json_object(text: str) -> Dict:
+    """Decode the first complete JSON object in text, skipping braces that do not start one."""
+    start = text.find('{')
+    while start != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(text, start)
+            return obj
+        except json.JSONDecodeError:
+            start = text.find('{', start + 1)
+    raise json.JSONDecodeError("No JSON object found in LLM response", text, 0)
+
+
+def _is_error_reply(content: str) -> bool:
+    """Whether content is the '# Error: ...' placeholder the generate_code* methods return on failure."""
+    return content.startswith("# Error:")
+
+
+def _has_json_object(text: str) -> bool:
+    """Whether a reply contains a JSON object, i.e. whether a batched content reply is usable."""
+    try:
+        _decode_first_json_object(text)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+def _is_approval(text: str) -> bool:
+    """Whether a verifier reply approves the plan.
+
+    Only approvals are cached: a cached rejection (or invalid reply) would make a rerun of a failed
+    workflow replay the same verdicts without ever asking the model again.
+    """
+    return text.startswith("APPROVED")
+
+
+class _JsonObjectScanner:
+    """Incrementally track brace depth to find where the first top-level JSON object ends.
+
+    Brace-balanced spans that do not decode as JSON (e.g. `{name: content}` in surrounding prose)
+    are skipped, as _decode_first_json_object does, and scanning carries on after them.
+    """
+
+    def __init__(self):
+        self.start = -1
+        self.end = -1
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._offset = 0
+        self._chunks: List[str] = []
+
+    def feed(self, text: str) -> bool:
+        """Consume the next chunk of text; return True once a decodable object has closed."""
+        self._chunks.append(text)
+        for i, ch in enumerate(text):
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"' and self._depth:
+                self._in_string = True
+            elif ch == '{':
+                if self._depth == 0:
+                    self.start = self._offset + i
+                self._depth += 1
+            elif ch == '}' and self._depth:
+                self._depth -= 1
+                if self._depth == 0 and self._decodes(self._offset + i + 1):
+                    self.end = self._offset + i + 1
+                    return True
+        self._offset += len(text)
+        return False
+
+    def _decodes(self, end: int) -> bool:
+        """Whether the span from start up to end is a complete JSON object."""
+        text = ''.join(self._chunks)
+        self._chunks = [text]
+        try:
+            obj, stop = _JSON_DECODER.raw_decode(text[:end], self.start)
+        except json.JSONDecodeError:
+            return False
+        return stop == end and isinstance(obj, dict)
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _load_manifest(project_path: Union[str, Path]) -> Dict[str, str]:
+    """Read the project's refinement manifest; a missing or unreadable manifest counts as empty."""
+    try:
+        with open(os.path.join(project_path, REFINED_MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return manifest if isinstance(manifest, dict) else {}
+
+
+def _write_file(path: Union[str, Path], content: str) -> None:
+    """Write a whole file with a single unbuffered write syscall."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, content.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
 class CodingAgent:
-    def __init__(self, base_path: str, provider: str = 'groq'):
-        """Initialize the coding agent with a base path."""
-        load_dotenv()
+    def __init__(self, base_path: str, provider: str = 'groq', cache_path: Optional[str] = None, verbose: bool = False,
+                 use_cache: bool = True):
+        """Initialize the coding agent with a base path. Per-file progress is only printed when verbose."""
         self.base_path = Path(base_path)
-        self.pp = PrettyPrinter(indent=2)
-        logging.basicConfig(level=logging.INFO)
+        self.verbose = verbose
         self.logger = logging.getLogger(__name__)
         self.provider = provider
-        self.groq_client = Groq(api_key=os.getenv('GROQ_API_KEY'))
-        if not self.groq_client.api_key:
-            self.logger.warning("No Groq API key provided or found in .env file.")
+        self._llm_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._llm_cache_lock = threading.Lock()
+        self._cache_file = Path(cache_path) if cache_path else LLM_CACHE_PATH
+        self.use_cache = use_cache
+
+    @functools.cached_property
+    def console(self) -> Optional["Console"]:
+        """Rich console for progress output, or None when rich is not installed."""
         try:
             from rich.console import Console
-            self.console = Console()
         except ImportError:
-            self.console = None
+            return None
+        return Console()
+
+    @functools.cached_property
+    def groq_client(self) -> "Groq":
+        """Groq client, created on first use so non-LLM workflows skip the HTTP/TLS setup."""
+        from groq import Groq
+        _load_env()
+        api_key = os.getenv('GROQ_API_KEY')
+        if not api_key:
+            self.logger.warning("No Groq API key provided or found in .env file.")
+        return Groq(api_key=api_key)
 
-    def generate_code(self, prompt: str, system_prompt: str, response_format: Optional[str] = None) -> str:
-        """Generate code using the specified provider."""
+    @functools.cached_property
+    def async_groq(self) -> "AsyncGroq":
+        """Async Groq client used by the per-file agents to overlap requests."""
+        from groq import AsyncGroq
+        _load_env()
+        return AsyncGroq(api_key=os.getenv('GROQ_API_KEY'), http_client=self._http)
+
+    @functools.cached_property
+    def _http(self) -> "httpx.AsyncClient":
+        """Pooled HTTP client shared by every async request, so TLS connections are reused across calls.
+
+        HTTP/2 multiplexing is enabled when the optional h2 package is installed.
+        """
+        import httpx
+        return httpx.AsyncClient(
+            http2=importlib.util.find_spec('h2') is not None,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS),
+            timeout=httpx.Timeout(HTTP_TIMEOUT),
+        )
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client; the async clients are recreated if the agent is used again."""
+        http = self.__dict__.pop('_http', None)
+        if http is None:
+            return
+        self.__dict__.pop('async_groq', None)
+        import litellm
+        if litellm.aclient_session is http:
+            litellm.aclient_session = None
+        await http.aclose()
+
+    @functools.cached_property
+    def _llm_db(self) -> Optional[sqlite3.Connection]:
+        """SQLite connection backing the response cache, opened on first lookup. Caller holds the cache lock.
+
+        None if the cache file cannot be opened; the in-memory LRU then works on its own.
+        """
+        try:
+            self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self._cache_file, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, content TEXT NOT NULL, created REAL NOT NULL)")
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f"Response cache at {self._cache_file} is unavailable, continuing without it: {e}")
+            return None
+        return db
+
+    def _disable_db(self, error: Exception) -> None:
+        """Stop using the SQLite cache after an I/O error. Caller holds the cache lock."""
+        self.logger.warning(f"Response cache at {self._cache_file} failed, continuing without it: {error}")
+        self.__dict__['_llm_db'] = None
+
+    @staticmethod
+    def _llm_cache_key(provider: str, system_prompt: str, prompt: str, response_format: Optional[str],
+                       history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Hash a request into a fixed-size cache key."""
+        raw = json.dumps([provider, system_prompt, history or [], prompt, response_format, LLM_TEMPERATURE]).encode('utf-8')
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Look a response up in the in-memory LRU, then in SQLite, ignoring entries older than LLM_CACHE_TTL."""
+        if not self.use_cache:
+            return None
+        with self._llm_cache_lock:
+            content = self._llm_cache.get(key)
+            if content is not None:
+                self._llm_cache.move_to_end(key)
+                return content
+            db = self._llm_db
+            if db is None:
+                return None
+            try:
+                row = db.execute(
+                    "SELECT content FROM responses WHERE key=? AND created>=?", (key, time.time() - LLM_CACHE_TTL)
+                ).fetchone()
+            except sqlite3.Error as e:
+                self._disable_db(e)
+                return None
+            if row is None:
+                return None
+            self._remember(key, row[0])
+            return row[0]
+
+    def _cache_put(self, key: str, content: str) -> None:
+        """Store a response in both cache levels. Error placeholders are never stored."""
+        if not self.use_cache or _is_error_reply(content):
+            return
+        with self._llm_cache_lock:
+            self._remember(key, content)
+            db = self._llm_db
+            if db is None:
+                return
+            try:
+                db.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, created) VALUES (?, ?, ?)", (key, content, time.time())
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                self._disable_db(e)
+
+    def _remember(self, key: str, content: str) -> None:
+        """Insert into the in-memory LRU, evicting the oldest entry when full. Caller holds the lock."""
+        self._llm_cache[key] = content
+        self._llm_cache.move_to_end(key)
+        if len(self._llm_cache) > LLM_CACHE_MAXSIZE:
+            self._llm_cache.popitem(last=False)
+
+    def generate_code(self, prompt: str, system_prompt: str, response_format: Optional[str] = None,
+                      history: Optional[List[Dict[str, str]]] = None, validate: Optional[Callable[[str], bool]] = None) -> str:
+        """Generate code using the specified provider, answering repeated requests from the response cache.
+
+        When validate is given, only replies it accepts are cached, so an unusable reply is retried next time.
+        """
+        key = self._llm_cache_key(self.provider, system_prompt, prompt, response_format, history)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
         if self.provider == 'groq':
-            return self.generate_code_with_groq(prompt, system_prompt, response_format)
+            content = self.generate_code_with_groq(prompt, system_prompt, response_format, history)
         else:
-            return self.generate_code_with_litellm(prompt, system_prompt, response_format)
+            content = self.generate_code_with_litellm(prompt, system_prompt, response_format, history)
+        if validate is None or validate(content):
+            self._cache_put(key, content)
+        return content
 
-    def generate_code_with_litellm(self, prompt: str, system_prompt: str, response_format: Optional[str] = None) -> str:
+    def _litellm_model_name(self) -> str:
+        """LiteLLM model identifier for the configured provider; unknown providers fall back to local Ollama."""
+        return LITELLM_MODELS.get(self.provider, LITELLM_MODELS["ollama"])
+
+    def generate_code_with_litellm(self, prompt: str, system_prompt: str, response_format: Optional[str] = None,
+                                   history: Optional[List[Dict[str, str]]] = None) -> str:
         """Generate code using LiteLLM with a dynamic system prompt."""
+        from litellm import completion
+        _load_env()
+        model_name = self._litellm_model_name()
+        messages = _build_messages(system_prompt, prompt, history)
         try:
-            model_name = ""
-            if self.provider == "gemini":   model_name = "gemini/gemini-2.5-pro"
-            elif self.provider == "groq": model_name = "groq/llama3-70b-8192"
-            elif self.provider == "openai":   model_name = "openai/gpt-4o-mini"
-            elif self.provider == "ollama":   model_name = "ollama/granite3.1-moe:3b"
             response = completion(
                 model=model_name,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
+                messages=messages,
+                temperature=LLM_TEMPERATURE,
                 response_format= {"type": "json_object"} if response_format == "json" else None,
             )
             return response.choices[0].message.content.strip() # type: ignore
@@ -58,60 +459,202 @@ class CodingAgent:
             self.logger.error(f"LiteLLM API error: {e}")
             return f"# Error: Failed to generate code: {e}"
 
-    def generate_code_with_groq(self, prompt: str, system_prompt: str, response_format: Optional[str] = None) -> str:
+    def generate_code_with_groq(self, prompt: str, system_prompt: str, response_format: Optional[str] = None,
+                                history: Optional[List[Dict[str, str]]] = None) -> str:
         """Generate code using Groq API with a dynamic system prompt."""
+        from groq import GroqError
+        model = "llama3-70b-8192"
         try:
             response = self.groq_client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
+                model=model,
+                messages=_build_messages(system_prompt, prompt, history),
+                temperature=LLM_TEMPERATURE,
+                response_format= {"type": "json_object"} if response_format == "json" else None,
+            )
+            content = response.choices[0].message.content.strip() # type: ignore
+        except GroqError as e:
+            self.logger.error(f"Groq API error: {e}")
+            return f"# Error: Failed to generate code: {e}"
+        except Exception as e:
+            self.logger.error(f"An unexpected error occurred: {e}")
+            return f"# Error: An unexpected error occurred: {e}"
+        return content
+
+    def generate_code_stream(self, prompt: str, system_prompt: str, stop_at_json: bool = False,
+                             history: Optional[List[Dict[str, str]]] = None) -> str:
+        """Stream a completion. With stop_at_json, stop as soon as the first top-level JSON object closes.
+
+        A stop_at_json reply is only cached once such an object has been found and decoded.
+        """
+        key = self._llm_cache_key(f"{self.provider}-stream", system_prompt, prompt, "json" if stop_at_json else None, history)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        messages = _build_messages(system_prompt, prompt, history)
+        if self.provider == 'groq':
+            from groq import GroqError
+            api_errors: Tuple[type, ...] = (GroqError,)
+            deltas = self._stream_groq(messages)
+        else:
+            api_errors = ()  # LiteLLM failures are reported by the generic handler below
+            deltas = self._stream_litellm(messages, stop_at_json)
+        parts: List[str] = []
+        scanner = _JsonObjectScanner()
+        complete = not stop_at_json
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                if stop_at_json and scanner.feed(delta):
+                    complete = True
+                    break
+        except api_errors as e:
+            self.logger.error(f"Groq API error: {e}")
+            return f"# Error: Failed to generate code: {e}"
+        except Exception as e:
+            self.logger.error(f"An unexpected error occurred: {e}")
+            return f"# Error: An unexpected error occurred: {e}"
+        finally:
+            deltas.close()
+        content = ''.join(parts)
+        if stop_at_json and complete:
+            content = content[scanner.start:scanner.end]
+        content = content.strip()
+        if complete:
+            self._cache_put(key, content)
+        return content
+
+    def _stream_groq(self, messages: List[Dict[str, str]]) -> Iterator[str]:
+        """Yield the text deltas of a streamed Groq completion, closing the HTTP stream when done."""
+        stream = self.groq_client.chat.completions.create(
+            model="llama3-70b-8192",
+            messages=messages,
+            temperature=LLM_TEMPERATURE,
+            # Groq does not offer JSON mode on streamed completions; the system prompt already demands bare JSON.
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            stream.close()
+
+    def _stream_litellm(self, messages: List[Dict[str, str]], json_mode: bool) -> Iterator[str]:
+        """Yield the text deltas of a streamed LiteLLM completion, closing the HTTP stream when done."""
+        from litellm import completion
+        _load_env()
+        stream = completion(
+            model=self._litellm_model_name(),
+            messages=messages,
+            temperature=LLM_TEMPERATURE,
+            response_format={"type": "json_object"} if json_mode else None,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+        finally:
+            # LiteLLM's stream wrapper has no sync close(); close the provider stream it wraps.
+            close = getattr(getattr(stream, 'completion_stream', None), 'close', None)
+            if close is not None:
+                close()
+
+    async def agenerate_code(self, prompt: str, system_prompt: str, response_format: Optional[str] = None,
+                             validate: Optional[Callable[[str], bool]] = None) -> str:
+        """Async counterpart of generate_code, sharing its response cache."""
+        key = self._llm_cache_key(self.provider, system_prompt, prompt, response_format)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return cached
+        if self.provider == 'groq':
+            content = await self.agenerate_code_with_groq(prompt, system_prompt, response_format)
+        else:
+            content = await self.agenerate_code_with_litellm(prompt, system_prompt, response_format)
+        if validate is None or validate(content):
+            self._cache_put(key, content)
+        return content
+
+    async def agenerate_code_with_litellm(self, prompt: str, system_prompt: str, response_format: Optional[str] = None) -> str:
+        """Async counterpart of generate_code_with_litellm."""
+        import litellm
+        from litellm import acompletion
+        _load_env()
+        litellm.aclient_session = self._http
+        model_name = self._litellm_model_name()
+        messages = _build_messages(system_prompt, prompt)
+        try:
+            response = await acompletion(
+                model=model_name,
+                messages=messages,
+                temperature=LLM_TEMPERATURE,
                 response_format= {"type": "json_object"} if response_format == "json" else None,
             )
             return response.choices[0].message.content.strip() # type: ignore
+        except Exception as e:
+            self.logger.error(f"LiteLLM API error: {e}")
+            return f"# Error: Failed to generate code: {e}"
+
+    async def agenerate_code_with_groq(self, prompt: str, system_prompt: str, response_format: Optional[str] = None) -> str:
+        """Async counterpart of generate_code_with_groq."""
+        from groq import GroqError
+        model = "llama3-70b-8192"
+        try:
+            response = await self.async_groq.chat.completions.create(
+                model=model,
+                messages=_build_messages(system_prompt, prompt),
+                temperature=LLM_TEMPERATURE,
+                response_format= {"type": "json_object"} if response_format == "json" else None,
+            )
+            content = response.choices[0].message.content.strip() # type: ignore
         except GroqError as e:
             self.logger.error(f"Groq API error: {e}")
             return f"# Error: Failed to generate code: {e}"
         except Exception as e:
             self.logger.error(f"An unexpected error occurred: {e}")
             return f"# Error: An unexpected error occurred: {e}"
+        return content
+
+    async def _agenerate_all(self, prompts: List[str], system_prompt: str, response_format: Optional[str] = None,
+                             semaphore: Optional[asyncio.Semaphore] = None,
+                             validate: Optional[Callable[[str], bool]] = None) -> List[Union[str, BaseException]]:
+        """Run agenerate_code over all prompts concurrently, at most MAX_CONCURRENT_REQUESTS at a time.
 
-    def plan_project(self, prompt: str) -> Optional[Dict]:
-        """Agent: Plan Project. Creates a comprehensive blueprint for the project."""
+        Pass a shared semaphore when several batches run side by side so the limit applies to all of them.
+        """
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+        async def _bounded(prompt: str) -> str:
+            async with semaphore:
+                return await self.agenerate_code(prompt, system_prompt, response_format=response_format, validate=validate)
+
+        return await asyncio.gather(*[_bounded(prompt) for prompt in prompts], return_exceptions=True)
+
+    def plan_project(self, prompt: str, history: Optional[List[Dict[str, str]]] = None) -> Optional[Dict]:
+        """Agent: Plan Project. Creates a comprehensive blueprint for the project.
+
+        On a retry, pass the original request and the rejected plan as history and only the feedback as prompt.
+        """
         if self.console:
             self.console.print("[bold cyan]Agent: Project Planner running...[/]")
-        
-        system_prompt = (
-            "You are a master software architect. Based on the user's request, create a comprehensive project blueprint. "
-            "The blueprint must be a single, clean JSON object, without any surrounding text or markdown. "
-            "It must contain two keys: 'readme_content' and 'project_structure'. "
-            "The 'readme_content' value must be a single string with properly escaped newlines () to be valid JSON. "
-            "The 'project_structure' value should be a JSON object representing the file and directory structure, with instructional comments in each file."
-        )
 
-        response_format = "json"
-        response_str = self.generate_code(prompt, system_prompt, response_format)
+        # Stream the reply and stop reading as soon as the blueprint object is complete.
+        response_str = self.generate_code_stream(prompt, SYSTEM_PLANNER, stop_at_json=True, history=history)
 
         try:
-            # Enhanced JSON extraction
-            json_str = None
-            json_match = re.search(r'```json\s*([\s\S]+?)\s*```', response_str)
+            # Enhanced JSON extraction; a reply that is already bare JSON skips the fenced-block search
+            json_match = None if response_str.lstrip().startswith('{') else _JSON_BLOCK_RE.search(response_str)
             if json_match:
-                json_str = json_match.group(1).strip()
+                plan = json.loads(json_match.group(1).strip())
             else:
-                start = response_str.find('{')
-                end = response_str.rfind('}') + 1
-                if start != -1 and end != -1:
-                    json_str = response_str[start:end].strip()
-
-            if not json_str:
-                 raise json.JSONDecodeError("No JSON object found in LLM response", response_str, 0)
-            
+                plan = _decode_first_json_object(response_str)
+
             if self.console:
                 self.console.print("[green]Project blueprint generated successfully.[/]")
-            return json.loads(json_str)
+            return plan
 
         except json.JSONDecodeError as e:
             self.logger.error(f"Failed to parse project blueprint: {e} Response was: {response_str}")
@@ -122,15 +665,9 @@ class CodingAgent:
         if self.console:
             self.console.print("[bold cyan]Agent: Project Verifier running...[/]")
 
-        system_prompt = (
-            "You are a meticulous project manager. Your task is to review the provided project blueprint. "
-            "Assess if the plan is logical, complete, and accurately reflects the user's initial request. "
-            "Respond with only 'APPROVED' if the plan is good, or 'REJECTED:' followed by your specific feedback for improvement."
-        )
-        
-        prompt = (f"Original User Request: '{original_prompt}' Generated Blueprint: {json.dumps(plan, indent=2)}")
+        prompt = (f"Original User Request: '{original_prompt}' Generated Blueprint: {dump_json(plan)}")
 
-        response = self.generate_code(prompt, system_prompt, response_format=None)
+        response = self.generate_code(prompt, SYSTEM_VERIFIER, response_format=None, validate=_is_approval)
 
         if response.startswith("APPROVED"):
             if self.console:
@@ -154,108 +691,213 @@ class CodingAgent:
         path_obj.mkdir(exist_ok=True, parents=True)
         # Create README.md from the plan
         readme_content = structure.get('readme_content', '# Project Generated by AI.')
-        with open(path_obj / 'README.md', 'w', encoding='utf-8') as f:
-            f.write(readme_content)
-        if self.console:
+        _write_file(path_obj / 'README.md', readme_content)
+        if self.console and self.verbose:
             self.console.print(f"[green]Created file:[/] {path_obj / 'README.md'}")
         # Create the rest of the structure
         project_structure = structure.get('project_structure', {})
         if project_structure:
-            self._create_directory_structure(path_obj, self._transform_structure(project_structure))
-
-    def _create_directory_structure(self, base_path: Path, children: List[Dict]) -> None:
-        """Recursively create directories and files."""
-        for item in children:
-            item_path = base_path / item['name']
-            if item['type'] == 'dir':
-                item_path.mkdir(exist_ok=True)
-                self._create_directory_structure(item_path, item.get('children', []))
-            elif item['type'] == 'file':
-                with open(item_path, 'w', encoding='utf-8') as f:
-                    f.write(item.get('content', ''))
-                if self.console:
-                    self.console.print(f"[cyan]Created file:[/][dim] {item_path}[/]")
-                self._create_directory_structure(item_path, item.get('children', []))
-            elif item_path.is_file():
-                with open(item_path, 'w', encoding='utf-8') as f:
-                    f.write(item.get('content', ''))
-                if self.console:
-                    self.console.print(f"[green]Created file:[/][dim] {item_path}[/]")
-
-    def _transform_structure(self, structure: Dict) -> List[Dict]:
-        """Transforms the dictionary-based structure into a list-based one for recursion."""
-        transformed_list = []
-        for name, content in structure.items():
-            if isinstance(content, dict):
-                transformed_list.append({
-                    'name': name,
-                    'type': 'dir',
-                    'children': self._transform_structure(content)
-                })
-            else:
-                transformed_list.append({
-                    'name': name,
-                    'type': 'file',
-                    'content': content
-                })
-        return transformed_list
-
-    def generate_file_content_from_instructions(self, project_path: str) -> None:
+            self._create_directory_structure(path_obj, project_structure)
+
+    def _create_directory_structure(self, base_path: Path, structure: Dict) -> None:
+        """Create the directories and files of a nested {name: content or sub-dict} structure."""
+        # Flatten the tree first; a directory is always listed before anything inside it.
+        dirs: List[Path] = []
+        files: List[Tuple[Path, str]] = []
+        stack = [(base_path, structure)]
+        while stack:
+            parent, entries = stack.pop()
+            for name, content in entries.items():
+                item_path = parent / name
+                if isinstance(content, dict):
+                    dirs.append(item_path)
+                    stack.append((item_path, content))
+                else:
+                    files.append((item_path, '' if content is None else str(content)))
+
+        console = self.console if self.verbose else None
+        for dir_path in dirs:
+            dir_path.mkdir(exist_ok=True)
+        for item_path, content in files:
+            _write_file(item_path, content)
+            if console is not None:
+                console.print(f"[cyan]Created file:[/][dim] {item_path}[/]")
+
+    def _collect_targets(self, project_path: str, include_python: bool = True, manifest: Optional[Dict[str, str]] = None
+                         ) -> Tuple[Dict[str, List[str]], List[Tuple[str, str]]]:
+        """Walk the project once, returning instruction stubs to generate and existing Python files to refine.
+
+        Stubs map their instruction text to every file carrying it; Python files are (path, code) pairs.
+        With include_python=False only stubs are collected, so non-stub files are never read in full.
+        Python files listed in the manifest are never treated as stubs, since refined code often starts
+        with '#' (shebang, license, coding line); unchanged ones are skipped, edited ones are refined.
+        """
+        console = self.console if self.verbose else None
+        stubs: Dict[str, List[str]] = {}
+        python_files: List[Tuple[str, str]] = []
+        for entry in _iter_files(project_path):
+            name = entry.name
+            # Skip README, as it's already generated, and the refinement manifest
+            if name.lower() == 'readme.md' or name == REFINED_MANIFEST:
+                continue
+            recorded = manifest.get(os.path.relpath(entry.path, project_path)) if manifest and name.endswith('.py') else None
+            if recorded is not None:
+                # Previously refined, so this is code rather than a stub even if it starts with '#'
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    code = f.read()
+                if recorded == _sha256(code):
+                    if console is not None:
+                        console.print(f"[dim]Skipping unchanged file:[/][dim] {entry.path}[/]")
+                elif include_python and code.strip():
+                    python_files.append((entry.path, code))
+                continue
+            if os.path.splitext(name)[1].lower() in TEXT_EXTS:
+                instructions = _read_instructions(entry)
+                if instructions is not None:
+                    if console is not None:
+                        console.print(f"[yellow]Generating content for:[/][dim] {entry.path}[/]")
+                    stubs.setdefault(instructions, []).append(entry.path)
+                    continue
+            if include_python and name.endswith('.py'):
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    original_code = f.read()
+                if not original_code.strip(): # Skip empty files
+                    if console is not None:
+                        console.print(f"[dim]Skipping empty file:[/][dim] {entry.path}[/]")
+                    continue
+                python_files.append((entry.path, original_code))
+        return stubs, python_files
+
+    async def _generate_contents(self, project_path: str, stubs: Dict[str, List[str]],
+                                 semaphore: Optional[asyncio.Semaphore] = None) -> Dict[str, str]:
+        """Generate and write the content of every stub; returns the written {path: content}."""
+        console = self.console if self.verbose else None
+
+        # Send the stubs in batches, one JSON map of path -> instructions per request. Each path is sent on
+        # its own, since the model may tailor a file's content to its path.
+        instructions_for = {file_path: instructions for instructions, paths in stubs.items() for file_path in paths}
+        pending = list(instructions_for)
+        batches = [pending[i:i + CONTENT_BATCH_SIZE] for i in range(0, len(pending), CONTENT_BATCH_SIZE)]
+        batches = [batch for batch in batches if len(batch) > 1]
+        labels = {file_path: os.path.relpath(file_path, project_path) for batch in batches for file_path in batch}
+        payloads = [json.dumps({labels[file_path]: instructions_for[file_path] for file_path in batch}) for batch in batches]
+        replies = await self._agenerate_all(
+            payloads, SYSTEM_CONTENT_GEN_BATCH, response_format="json", semaphore=semaphore, validate=_has_json_object,
+        )
+
+        results: Dict[str, Union[str, BaseException]] = {}
+        for batch, reply in zip(batches, replies):
+            try:
+                contents = _decode_first_json_object(reply) if isinstance(reply, str) else {}
+            except json.JSONDecodeError:
+                contents = {}
+            for file_path in batch:
+                content = contents.get(labels[file_path])
+                if isinstance(content, str):
+                    results[file_path] = content
+
+        # Single leftover stubs and anything a batch reply dropped are generated one file at a time. These
+        # prompts carry no path, so files sharing the same instructions share one request.
+        missing = list(dict.fromkeys(instructions_for[file_path] for file_path in pending if file_path not in results))
+        fallback = dict(zip(missing, await self._agenerate_all(missing, SYSTEM_CONTENT_GEN, semaphore=semaphore)))
+        for file_path in pending:
+            if file_path not in results:
+                results[file_path] = fallback[instructions_for[file_path]]
+
+        written: Dict[str, str] = {}
+        for file_path in pending:
+            generated_content = results[file_path]
+            # Failed requests leave the stub in place, so the next run retries it
+            if isinstance(generated_content, BaseException) or _is_error_reply(generated_content):
+                self.logger.error(f"Content generation failed for {file_path}: {generated_content}")
+                continue
+            _write_file(file_path, generated_content)
+            written[file_path] = generated_content
+            if console is not None:
+                console.print(f"[green]Successfully updated:[/][dim] {file_path}[/]")
+        if self.console:
+            self.console.print(f"[green]Generated content for {len(written)} files ({len(batches) + len(missing)} requests).[/]")
+        return written
+
+    async def _refine_files(self, project_path: str, python_files: List[Tuple[str, str]], manifest: Dict[str, str],
+                            semaphore: Optional[asyncio.Semaphore] = None) -> int:
+        """Refine and write back each (path, code) pair, recording the refined hashes in manifest.
+
+        Files whose code matches their manifest hash were refined last run and are skipped.
+        Returns the number of files written.
+        """
+        console = self.console if self.verbose else None
+        pending = []
+        for file_path, code in python_files:
+            rel_path = os.path.relpath(file_path, project_path)
+            if manifest.get(rel_path) == _sha256(code):
+                if console is not None:
+                    console.print(f"[dim]Skipping unchanged file:[/][dim] {file_path}[/]")
+                continue
+            pending.append((file_path, code))
+            if console is not None:
+                console.print(f"[yellow]Refining code in:[/][dim] {file_path}[/]")
+        python_files = pending
+
+        results = await self._agenerate_all([code for _, code in python_files], SYSTEM_REFINER, semaphore=semaphore)
+
+        refined = 0
+        for (file_path, _), refined_code in zip(python_files, results):
+            # Failed requests leave the file's code untouched
+            if isinstance(refined_code, BaseException) or _is_error_reply(refined_code):
+                self.logger.error(f"Refinement failed for {file_path}: {refined_code}")
+                continue
+            _write_file(file_path, refined_code)
+            manifest[os.path.relpath(file_path, project_path)] = _sha256(refined_code)
+            refined += 1
+            if console is not None:
+                console.print(f"[green]Successfully updated:[/] {file_path}")
+        return refined
+
+    def _save_manifest(self, project_path: str, manifest: Dict[str, str]) -> None:
+        try:
+            _write_file(os.path.join(project_path, REFINED_MANIFEST), json.dumps(manifest, indent=2, sort_keys=True))
+        except OSError as e:
+            self.logger.error(f"Could not write the refinement manifest: {e}")
+
+    async def generate_file_content_from_instructions(self, project_path: str) -> None:
         """Agent: Generate File Content. Populates files based on instructional comments."""
         if self.console:
             self.console.print(f"[bold cyan]Agent: Content Generator running for project at:[/][dim] {project_path}[/]")
-        
-        system_prompt = (
-            "You are a sophisticated AI file processor. Based on the instructional comments provided, generate the full, complete content for the file. "
-            "Return only the raw code or text for the file, without any surrounding text, explanations, or markdown."
-        )
+        stubs, _ = self._collect_targets(project_path, include_python=False)
+        await self._generate_contents(project_path, stubs)
 
-        for root, _, files in os.walk(project_path):
-            for file in files:
-                # Skip README, as it's already generated
-                if file.lower() == 'readme.md':
-                    continue
-                file_path = Path(root) / file
-                with open(file_path, 'r+', encoding='utf-8') as f:
-                    instructions = f.read()
-                    if instructions.strip().startswith('#'):
-                        if self.console:
-                            self.console.print(f"[yellow]Generating content for:[/][dim] {file_path}[/]")
-
-                        generated_content = self.generate_code(instructions, system_prompt, response_format=None)
-                        f.seek(0)
-                        f.write(generated_content)
-                        f.truncate()
-                        if self.console:
-                            self.console.print(f"[green]Successfully updated:[/][dim] {file_path}[/]")
-
-    def refine_python_code(self, project_path: str) -> None:
+    async def refine_python_code(self, project_path: str) -> None:
         """Agent: Refine and Debug Code. Cleans, refactors, and debugs Python files."""
-        system_prompt = (
-            "You are a sophisticated AI file processor. Based on the instructional comments provided, generate the full, complete content for the file. "
-            "Return only the raw code or text for the file, without any surrounding text, explanations, or markdown."
+        manifest = _load_manifest(project_path)
+        stubs, python_files = self._collect_targets(project_path, manifest=manifest)
+        python_stubs = [(path, instructions) for instructions, paths in stubs.items() for path in paths if path.endswith('.py')]
+        refined = await self._refine_files(project_path, python_files + python_stubs, manifest)
+        self._save_manifest(project_path, manifest)
+        if self.console:
+            self.console.print(f"[green]Refined {refined} Python files.[/]")
+
+    async def build_project_files(self, project_path: str) -> None:
+        """Agents: Generate File Content and Refine Code, fused into a single walk of the project.
+
+        Python files that already hold code are refined while the stubs are generated; generated
+        Python files are then refined from memory, without being read back from disk.
+        """
+        if self.console:
+            self.console.print(f"[bold cyan]Agent: Content Generator and Code Refiner running for project at:[/][dim] {project_path}[/]")
+        manifest = _load_manifest(project_path)
+        stubs, python_files = self._collect_targets(project_path, manifest=manifest)
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+        generated, refined = await asyncio.gather(
+            self._generate_contents(project_path, stubs, semaphore),
+            self._refine_files(project_path, python_files, manifest, semaphore),
         )
-        for root, _, files in os.walk(project_path):
-            for file in files:
-                # Skip README, as it's already generated
-                if file.endswith('.py'):
-                    file_path = Path(root) / file
-                    with open(file_path, 'r+', encoding='utf-8') as f:
-                        original_code = f.read()
-
-                        if not original_code.strip(): # Skip empty files
-                            if self.console:
-                                self.console.print(f"[dim]Skipping empty file:[/][dim] {file_path}[/]")
-                                continue
-                            
-                        if self.console:
-                            self.console.print(f"[yellow]Refining code in:[/][dim] {file_path}[/]")
-
-                        refined_code = self.generate_code(original_code, system_prompt, response_format=None)
-
-                        f.seek(0)
-                        f.write(refined_code)
-                        f.truncate()
-                        if self.console:
-                            self.console.print(f"[green]Successfully updated:[/] {file_path}")
-                            
\ No newline at end of file
+        refined += await self._refine_files(
+            project_path,
+            [(path, content) for path, content in generated.items() if path.endswith('.py') and content.strip()],
+            manifest,
+            semaphore,
+        )
+        self._save_manifest(project_path, manifest)
+        if self.console:
+            self.console.print(f"[green]Refined {refined} Python files.[/]")
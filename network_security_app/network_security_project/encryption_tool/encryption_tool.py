@@ -1,15 +1,19 @@
+import functools
 import cryptography
 from cryptography.fernet import Fernet
 
+# Reuse one Fernet instance per key instead of re-decoding the key on every call
+@functools.lru_cache(maxsize=64)
+def _cipher(key):
+    return Fernet(key)
+
 # Encrypt and decrypt data
 def encrypt(data, key):
-    cipher_suite = Fernet(key)
-    cipher_text = cipher_suite.encrypt(data.encode())
+    cipher_text = _cipher(key).encrypt(data.encode())
     return cipher_text
 
 def decrypt(data, key):
-    cipher_suite = Fernet(key)
-    plain_text = cipher_suite.decrypt(data)
+    plain_text = _cipher(key).decrypt(data)
     return plain_text.decode()
 
 if __name__ == '__main__':
@@ -1,25 +1,49 @@
-keys = {}
+import threading
+
+_MISSING = object()
+
+class KeyStore:
+    # Every operation holds the lock, so the store can be shared between threads
+    def __init__(self):
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def get(self, key_name, default=None):
+        with self._lock:
+            return self._keys.get(key_name, default)
+
+    def set(self, key_name, key_value):
+        with self._lock:
+            self._keys[key_name] = key_value
+
+    def set_many(self, items):
+        # One lock acquisition and one dict update for the whole batch
+        with self._lock:
+            self._keys.update(items)
+
+    def replace(self, key_name, key_value):
+        with self._lock:
+            if key_name not in self._keys:
+                return False
+            self._keys[key_name] = key_value
+            return True
+
+    def delete(self, key_name):
+        with self._lock:
+            return self._keys.pop(key_name, _MISSING) is not _MISSING
+
+keys = KeyStore()
 
 def create_key(key_name, key_value):
-    keys[key_name] = key_value
-    return f"Key '{key_name}' created with value '{key_value}'"
+    keys.set(key_name, key_value)
+    return True
 
 def get_key(key_name):
-    if key_name in keys:
-        return keys[key_name]
-    else:
-        return f"Key '{key_name}' not found"
+    # Returns None when the key does not exist
+    return keys.get(key_name)
 
 def update_key(key_name, new_key_value):
-    if key_name in keys:
-        keys[key_name] = new_key_value
-        return f"Key '{key_name}' updated with new value '{new_key_value}'"
-    else:
-        return f"Key '{key_name}' not found"
+    return keys.replace(key_name, new_key_value)
 
 def delete_key(key_name):
-    if key_name in keys:
-        del keys[key_name]
-        return f"Key '{key_name}' deleted"
-    else:
-        return f"Key '{key_name}' not found"
\ No newline at end of file
+    return keys.delete(key_name)
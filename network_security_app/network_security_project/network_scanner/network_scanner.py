@@ -1,17 +1,33 @@
-import socket
-import os
+import asyncio
+
+SUBNET = "192.168.1"
+PROBE_PORT = 80
+PROBE_TIMEOUT = 1.0
+MAX_CONCURRENT_PROBES = 64  # At most this many of the 254 probes hold a socket open at once
+
+async def probe(addr, semaphore):
+    # A TCP connect attempt stands in for ping: any answer, even a refusal, means a host is up
+    async with semaphore:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(addr, PROBE_PORT), timeout=PROBE_TIMEOUT)
+        except ConnectionRefusedError:
+            return addr
+        except (OSError, asyncio.TimeoutError):
+            return None
+        writer.close()
+        return addr
+
+async def scan_network_async():
+    # Probe every address in the subnet concurrently instead of one ping at a time
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_PROBES)
+    results = await asyncio.gather(*(probe(f"{SUBNET}.{ip}", semaphore) for ip in range(1, 255)))
+    return [addr for addr in results if addr]
 
 def scan_network():
-    list_of_ips = []
-    for ip in range(1, 255):
-        addr = f"192.168.1.{ip}"
-        res = os.system(f"ping -c 1 {addr} > /dev/null 2>&1")
-        if res == 0:
-            list_of_ips.append(addr)
-    return list_of_ips
+    return asyncio.run(scan_network_async())
 
 if __name__ == '__main__':
     active_ips = scan_network()
     print("Active devices on the network:")
     for ip in active_ips:
-        print(ip)
\ No newline at end of file
+        print(ip)
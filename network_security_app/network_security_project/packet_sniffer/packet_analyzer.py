@@ -1,24 +1,27 @@
-def analyze_packet(packet):
-    # Check for unusual packet size
-    if len(packet) > 1024:
-        print("Suspicious packet size detected!")
-
-    # Check for unusual packet contents
-    if b"malicious_string" in packet:
-        print("Suspicious packet contents detected!")
+import sys
 
-    # Check for unusual packet source IP
-    if packet.src_ip == "192.168.1.100":
-        print("Suspicious packet source IP detected!")
+# One message per check, indexed by the check's bit in the flags mask
+SUSPICIOUS_MESSAGES = (
+    "Suspicious packet size detected!",
+    "Suspicious packet contents detected!",
+    "Suspicious packet source IP detected!",
+    "Suspicious packet destination IP detected!",
+    "Suspicious packet protocol detected!",
+)
 
-    # Check for unusual packet destination IP
-    if packet.dst_ip == "8.8.8.8":
-        print("Suspicious packet destination IP detected!")
-
-    # Check for unusual packet protocol
-    if packet.proto == "icmp":
-        print("Suspicious packet protocol detected!")
+def analyze_packet(packet):
+    # Run every check into one bitmask: size, contents, source IP, destination IP, protocol
+    flags = (
+        (len(packet) > 1024)
+        | (b"malicious_string" in packet) << 1
+        | (packet.src_ip == "192.168.1.100") << 2
+        | (packet.dst_ip == "8.8.8.8") << 3
+        | (packet.proto == "icmp") << 4
+    )
 
-    # If no suspicious activity found, print a success message
+    # Report all findings with a single write; the success message only when every check passed
+    if flags:
+        sys.stdout.write("\n".join(msg for i, msg in enumerate(SUSPICIOUS_MESSAGES) if flags >> i & 1) + "\n")
     else:
-        print("Packet analysis complete. No suspicious activity found.")
\ No newline at end of file
+        sys.stdout.write("Packet analysis complete. No suspicious activity found.\n")
+    return flags
@@ -1,23 +1,40 @@
 import socket
+import sys
 import pcap
 
+# Packet reports are buffered and written together every FLUSH_EVERY packets
+FLUSH_EVERY = 64
+
 def capture_packets():
     # Open a live capture on the default network interface
     pc = pcap.pcap()
 
+    # The link type is fixed for the capture session, so look it up once
+    packet_info = pcap.datalink().name + ' packet captured'
+
     # Start sniffing and print packet information
-    for pkt in pc:
-        # Extract packet information
-        packet = pkt[0]
-        packet_hex = ''.join(format(byte, '02x') for byte in packet)
-        packet_info = pcap.datalink().name + ' packet captured'
-        packet_length = len(packet)
+    buffered = []
+    try:
+        for pkt in pc:
+            # Extract packet information
+            packet = pkt[0]
+            packet_hex = bytes(packet).hex()
+            packet_length = len(packet)
 
-        # Print packet information
-        print(f'Packet captured: {packet_info}')
-        print(f'Packet length: {packet_length} bytes')
-        print(f'Packet hex: {packet_hex}')
-        print('')
+            buffered.append(
+                f'Packet captured: {packet_info}\n'
+                f'Packet length: {packet_length} bytes\n'
+                f'Packet hex: {packet_hex}\n'
+                '\n'
+            )
+            if len(buffered) >= FLUSH_EVERY:
+                sys.stdout.write(''.join(buffered))
+                sys.stdout.flush()
+                buffered.clear()
+    finally:
+        # Don't lose the last partial batch when the capture stops (e.g. on Ctrl+C)
+        sys.stdout.write(''.join(buffered))
+        sys.stdout.flush()
 
 if __name__ == '__main__':
-    capture_packets()
\ No newline at end of file
+    capture_packets()
@@ -1,30 +1,40 @@
 import argparse
-from main_engine import CodingAgent
+import asyncio
+import logging
+from main_engine import CodingAgent, dump_json
 from dotenv import load_dotenv
-import json
 
-def main():
+async def main():
     load_dotenv()
+    logging.basicConfig(level=logging.INFO)
     parser = argparse.ArgumentParser(description="An autonomous coding agent workflow.")
 
     parser.add_argument('--prompt', type=str, required=True, help='The initial prompt describing the project to build.')
     parser.add_argument('--project_path', type=str, default='./new_project', help='The base path for the new project.')
     parser.add_argument('--max_retries', type=int, default=3, help='Maximum retries for the planning and verification loop.')
     parser.add_argument('--provider', type=str, default='groq', help='The provider to use for inference (e.g., groq, gemini).')
+    parser.add_argument('--no-cache', action='store_true', help='Always call the provider instead of reusing cached responses.')
+    parser.add_argument('--verbose', action='store_true', help='Print a line for every file created, generated or refined.')
     args = parser.parse_args()
 
-    agent = CodingAgent(args.project_path, provider=args.provider)
-    
+    agent = CodingAgent(args.project_path, provider=args.provider, verbose=args.verbose, use_cache=not args.no_cache)
+    try:
+        await run_workflow(agent, args)
+    finally:
+        await agent.aclose()
+
+async def run_workflow(agent, args):
     # --- New Autonomous Workflow ---
     
     current_prompt = args.prompt
+    history = None
     approved_plan = None
     
     for i in range(args.max_retries):
         agent.console.print(f"[bold magenta]--- Planning Attempt {i+1}/{args.max_retries} ---[/]") # type: ignore
         
         # 1. Plan the project
-        plan = agent.plan_project(current_prompt)
+        plan = agent.plan_project(current_prompt, history)
         if not plan:
             agent.console.print("[red]Failed to generate a project plan. Aborting.[/]") # type: ignore
             return
@@ -38,7 +48,12 @@ def main():
             break
         else:
             agent.console.print(f"[yellow]Plan rejected. Refining prompt with feedback...[/]") # type: ignore
-            current_prompt = f"Original prompt: '{args.prompt}'. Previous plan: {json.dumps(plan)}. Feedback: '{feedback}'. Please generate a new, improved plan based on this feedback."
+            # Replay the request and the rejected plan as earlier turns so only the feedback is new input.
+            history = [
+                {"role": "user", "content": args.prompt},
+                {"role": "assistant", "content": dump_json(plan)},
+            ]
+            current_prompt = f"Feedback: '{feedback}'. Please generate a new, improved plan based on this feedback."
             
     if not approved_plan:
         agent.console.print("[red]Failed to get an approved project plan after several attempts. Aborting.[/]") # type: ignore
@@ -47,14 +62,11 @@ def main():
     # 3. Create the project directory and structure
     agent.create_project_directory(args.project_path, approved_plan)
     
-    # 4. Generate file content from instructions
-    agent.generate_file_content_from_instructions(args.project_path)
-    
-    # 5. Refine the generated Python code
-    agent.refine_python_code(args.project_path)
+    # 4. Generate file content from instructions and refine the Python code, in one pass over the project
+    await agent.build_project_files(args.project_path)
     
     agent.console.print("[bold green]--- Full Workflow Completed Successfully! ---[/]") # type: ignore
     agent.console.print(f"Project created at: {args.project_path}") # type: ignore
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())